@@ -0,0 +1,100 @@
+"""
+Dynamic Request Batching
+Coalesces concurrent single-item requests into one batched model call
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+MAX_BATCH = 32
+MAX_WAIT_MS = 5
+# Upper bound for Future.result() so a stuck worker fails requests instead of
+# hanging them
+RESULT_TIMEOUT_S = 30
+
+
+class RequestBatcher:
+    """
+    Coalesces concurrent single-item requests into one batched call.
+    
+    When nothing else is in flight, submit() calls batch_fn([item]) inline in
+    the caller's thread. Otherwise it queues (item, Future) for a background
+    thread, which takes the first queued item; if more requests are already
+    waiting it keeps collecting for up to max_wait_ms (or max_batch items),
+    otherwise it runs immediately. batch_fn is called once on the list of
+    items and must return one result per item.
+    """
+    
+    def __init__(self, batch_fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._worker = None
+    
+    def submit(self, item):
+        future = Future()
+        with self._lock:
+            idle = self._pending == 0
+            self._pending += 1
+        
+        if idle:
+            # Uncontended: skip the hand-off to the worker thread
+            try:
+                future.set_result(self.batch_fn([item])[0])
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._done(1)
+            return future
+        
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+    
+    def _done(self, n):
+        with self._lock:
+            self._pending -= n
+    
+    def _ensure_worker(self):
+        # Started lazily so the thread belongs to the process serving requests,
+        # and restarted if it ever died
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+    
+    def _collect(self):
+        batch = [self._queue.get()]
+        if self._queue.empty():
+            return batch
+        
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._done(len(batch))
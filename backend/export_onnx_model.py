@@ -0,0 +1,64 @@
+"""
+Export the efficiency loss model to ONNX
+Writes efficiency_loss_model.onnx next to the .pkl. The tilt optimizer opens
+it with load_onnx_session() (re-exporting when it is stale) and ml_api.py
+shares that session when onnxruntime is installed.
+
+Usage: python export_onnx_model.py
+"""
+
+import os
+import joblib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "efficiency_loss_model.pkl")
+ONNX_MODEL_PATH = os.path.join(BASE_DIR, "efficiency_loss_model.onnx")
+
+
+def export_onnx(model, path=ONNX_MODEL_PATH):
+    """
+    Convert a fitted sklearn model with skl2onnx and write it to path.
+    The file is written under a temporary name and renamed into place, so a
+    process starting concurrently never reads a partial model.
+    """
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    # Features in the same order as training
+    onnx_model = convert_sklearn(
+        model, initial_types=[("X", FloatTensorType([None, model.n_features_in_]))]
+    )
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    os.replace(tmp_path, path)
+
+
+def load_onnx_session(model, path=ONNX_MODEL_PATH, model_path=MODEL_PATH):
+    """
+    Open an ONNX Runtime session for model, re-exporting it first if the
+    .onnx file is missing or older than the .pkl. Raises if onnxruntime is
+    unavailable or a needed re-export fails, so a stale file is never served.
+    
+    Returns:
+        Tuple of (session, input_name)
+    """
+    import onnxruntime as ort
+
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+        export_onnx(model, path)
+
+    # Single-threaded session: a single row gains nothing from intra-op
+    # threads, and there is no thread pool to lose when gunicorn forks
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    session = ort.InferenceSession(
+        path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    return session, session.get_inputs()[0].name
+
+
+if __name__ == "__main__":
+    export_onnx(joblib.load(MODEL_PATH))
+    print(f"✅ Exported ONNX model to {ONNX_MODEL_PATH}")
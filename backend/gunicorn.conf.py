@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for the Solar ML API
+
+CPU: 2*NCPU+1 threaded workers so sklearn predictions and image decoding
+overlap across requests.
+GPU: a single worker with more threads so all requests share one CUDA
+context and can be batched on the same device.
+
+On CPU the app is preloaded in the master so the models are loaded once and
+forked workers share their memory copy-on-write. CUDA cannot be initialized
+before forking, so the GPU worker loads the models itself and the device
+check in the master goes through NVML.
+"""
+
+import multiprocessing
+import os
+
+# Let torch.cuda.is_available() query NVML instead of initializing the CUDA
+# runtime in the master, which would make CUDA unusable in forked workers
+os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+
+import torch
+
+bind = os.environ.get("ML_API_BIND", "0.0.0.0:5001")
+worker_class = "gthread"
+
+# ML_API_DEVICE=cpu|cuda overrides detection (ml_api.py reads it too)
+device = os.environ.get("ML_API_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+
+if device == "cuda":
+    workers = 1
+    threads = 8
+    preload_app = False
+else:
+    workers = 2 * multiprocessing.cpu_count() + 1
+    threads = 4
+    preload_app = True
+
+
+def post_fork(server, worker):
+    """Run torch single-threaded in each CPU worker."""
+    if device != "cuda":
+        # 2*NCPU+1 workers already cover the cores, so each worker runs one
+        # intra-op thread; this also keeps OpenMP out of the forked children
+        torch.set_num_threads(1)
@@ -3,68 +3,335 @@ Flask ML API for Solar Panel Analysis
 Serves predictions from the trained efficiency loss model and image classification
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_cors import CORS
-import joblib
 import numpy as np
+import orjson
 import os
 import io
 import base64
+import functools
+import hashlib
+import logging
+import operator
+import threading
+import warnings
+from collections import OrderedDict
 import torch
 import torch.nn as nn
 from torchvision import transforms, models
+from torchvision.io import ImageReadMode, decode_jpeg
+from torchvision.transforms import v2 as transforms_v2
 from PIL import Image
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+from batching import MAX_BATCH, RESULT_TIMEOUT_S, RequestBatcher
+
+# Module loggers (e.g. the tilt optimizer) report through the root logger
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
 # Import the tilt optimizer
+from optimization import tilt_optimizer
 from optimization.tilt_optimizer import get_optimization_result, find_best_tilt
 
 app = Flask(__name__)
 CORS(app)
 
+
+def ojson(obj, status=200):
+    """JSON response serialized with orjson (handles numpy scalars and arrays)."""
+    return app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype="application/json"
+    )
+
 # ============ EFFICIENCY LOSS MODEL ============
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "efficiency_loss_model.pkl")
+# The tilt optimizer loads the model (and its ONNX Runtime session, kept in
+# sync with the .pkl) once; the efficiency endpoints share the same copy.
+# With gunicorn preloading on CPU, forked workers share it copy-on-write.
+MODEL_PATH = tilt_optimizer.MODEL_PATH
+model = tilt_optimizer.rf_model
+onnx_session = tilt_optimizer.onnx_session
+onnx_input_name = tilt_optimizer.onnx_input_name
 
-try:
-    model = joblib.load(MODEL_PATH)
-    print(f"✅ Efficiency model loaded successfully from {MODEL_PATH}")
-except Exception as e:
-    print(f"⚠️ Error loading efficiency model: {e}")
-    model = None
+if model is not None:
+    try:
+        # Warm up so lazy allocations happen at startup rather than on the first request
+        model.predict(np.zeros((1, 7), dtype=np.float32))
+        if onnx_session is not None:
+            onnx_session.run(None, {onnx_input_name: np.zeros((1, 7), dtype=np.float32)})
+        print(f"✅ Efficiency model loaded successfully from {MODEL_PATH}")
+    except Exception as e:
+        print(f"⚠️ Error loading efficiency model: {e}")
+        model = None
+        onnx_session = None
+else:
+    print(f"⚠️ Error loading efficiency model from {MODEL_PATH}")
+
+
+def _predict_efficiency(features):
+    """
+    Predict efficiency loss for an (N, 7) float32 feature array.
+    Uses the ONNX Runtime session when available, otherwise the sklearn model.
+    """
+    if onnx_session is not None:
+        return onnx_session.run(None, {onnx_input_name: features})[0].ravel()
+    return model.predict(features)
+
+# Features in the same order as training
+EFFICIENCY_FEATURES = tilt_optimizer.FEATURE_NAMES
+REQUIRED_EFFICIENCY_FIELDS = frozenset(EFFICIENCY_FEATURES)
+get_efficiency_features = operator.itemgetter(*EFFICIENCY_FEATURES)
+
+# Feature order and defaults used by the batch endpoint (same order as training)
+BATCH_FEATURE_DEFAULTS = (
+    ("temperature", 25),
+    ("humidity", 50),
+    ("wind_speed", 5),
+    ("irradiance", 500),
+    ("voltage", 30),
+    ("current", 8),
+    ("days_since_installation", 0),
+)
 
 # ============ IMAGE CLASSIFICATION MODEL ============
 IMAGE_MODEL_PATH = os.path.join(os.path.dirname(__file__), "pv_classifier.pth")
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# int8 TorchScript model produced by quantize_image_model.py, preferred on CPU
+IMAGE_MODEL_INT8_PATH = os.path.join(os.path.dirname(__file__), "pv_classifier_int8.pt")
+# ML_API_DEVICE=cpu|cuda overrides detection (see gunicorn.conf.py)
+device = torch.device(os.environ.get("ML_API_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu"))
+# Half precision halves memory traffic and uses tensor cores on CUDA
+IMAGE_DTYPE = torch.float16 if device.type == "cuda" else torch.float32
+# Let cuDNN pick the fastest conv algorithms. It searches again for every new
+# input shape; images are always 224x224 and batches are capped at MAX_BATCH,
+# so the warm-up below covers every shape the API produces.
+torch.backends.cudnn.benchmark = True
+
+
+def _compile_image_model(net):
+    """
+    Convert the classifier to IMAGE_DTYPE and channels_last layout and trace
+    it to an inference-optimized TorchScript module. Falls back to the eager
+    model if tracing fails.
+    """
+    net = net.to(dtype=IMAGE_DTYPE, memory_format=torch.channels_last)
+    example = torch.randn(1, 3, 224, 224, device=device, dtype=IMAGE_DTYPE)
+    example = example.to(memory_format=torch.channels_last)
+    try:
+        with torch.no_grad():
+            traced = torch.jit.trace(net, example)
+        return torch.jit.optimize_for_inference(traced)
+    except Exception as e:
+        print(f"⚠️ TorchScript compilation failed, using eager model: {e}")
+        return net
+
 
 try:
-    # Initialize ResNet18 architecture
-    image_model = models.resnet18(weights=None)
-    image_model.fc = nn.Linear(image_model.fc.in_features, 2)
-    image_model.load_state_dict(torch.load(IMAGE_MODEL_PATH, map_location=device))
-    image_model = image_model.to(device)
-    image_model.eval()
-    print(f"✅ Image classifier loaded successfully from {IMAGE_MODEL_PATH}")
+    if device.type == "cpu" and os.path.exists(IMAGE_MODEL_INT8_PATH):
+        # Quantized ResNet18: int8 kernels use VNNI/AMX on recent x86 CPUs
+        image_model = torch.jit.load(IMAGE_MODEL_INT8_PATH, map_location=device)
+        image_model.eval()
+        loaded_image_model_path = IMAGE_MODEL_INT8_PATH
+    else:
+        # Initialize ResNet18 architecture
+        image_model = models.resnet18(weights=None)
+        image_model.fc = nn.Linear(image_model.fc.in_features, 2)
+        image_model.load_state_dict(torch.load(IMAGE_MODEL_PATH, map_location=device))
+        image_model = image_model.to(device)
+        image_model.eval()
+        image_model = _compile_image_model(image_model)
+        loaded_image_model_path = IMAGE_MODEL_PATH
+    # Warm up so the TorchScript profiling passes (two runs) and, on CUDA,
+    # cuDNN's algorithm search for each batch size 1..MAX_BATCH finish before
+    # the first request
+    warmup_sizes = [1, 1] + (list(range(2, MAX_BATCH + 1)) if device.type == "cuda" else [])
+    with torch.inference_mode():
+        for n in warmup_sizes:
+            image_model(torch.zeros(n, 3, 224, 224, device=device, dtype=IMAGE_DTYPE)
+                        .to(memory_format=torch.channels_last))
+    print(f"✅ Image classifier loaded successfully from {loaded_image_model_path}")
     print(f"   Running on: {device}")
 except Exception as e:
     print(f"⚠️ Error loading image classifier: {e}")
     image_model = None
 
-# Image preprocessing transforms (same as training)
+# Image preprocessing transforms (same as training). Normalization is applied
+# on the device after the batch is copied over, see _classify_images.
 image_transform = transforms.Compose([
     transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    transforms.ToTensor()
 ])
+IMAGE_MEAN = torch.tensor([0.485, 0.456, 0.406], device=device, dtype=IMAGE_DTYPE).view(1, 3, 1, 1)
+IMAGE_STD = torch.tensor([0.229, 0.224, 0.225], device=device, dtype=IMAGE_DTYPE).view(1, 3, 1, 1)
+JPEG_MAGIC = b"\xff\xd8\xff"
+# Largest decoded image accepted through the base64 JSON field
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# decode_jpeg only reads its input, so wrapping immutable upload bytes is safe
+warnings.filterwarnings("ignore", message="The given buffer is not writable")
+
+
+def _load_image(data):
+    """
+    Decode raw image bytes into a (3, 224, 224) float tensor in [0, 1].
+    
+    On CUDA, JPEGs are decoded and resized directly on the GPU (NVJPEG);
+    everything else goes through PIL + image_transform on the CPU.
+    """
+    if device.type == "cuda" and data[:3] == JPEG_MAGIC:
+        buf = torch.frombuffer(data, dtype=torch.uint8)
+        img = decode_jpeg(buf, mode=ImageReadMode.RGB, device=device)
+        img = transforms_v2.functional.resize(img, [224, 224], antialias=True)
+        return img.float().div_(255)
+    
+    img = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder subsample straight to roughly the target size
+    img.draft("RGB", (224, 224))
+    return image_transform(img.convert("RGB"))
+
+
+def _classify_images(images):
+    """
+    Run the image classifier on a list of preprocessed image tensors
+    (output of _load_image) in a single forward pass.
+    
+    Returns:
+        List of (pred_class, confidence, probabilities) tuples, one per image,
+        where confidence is the probability of pred_class and probabilities
+        is a numpy array of [defective, normal] probabilities
+    """
+    if not images:
+        return []
+    
+    if device.type == "cuda":
+        # GPU-decoded JPEGs are already on the device. The rest are pinned first
+        # so the non_blocking host-to-device copy can overlap with compute.
+        images = [
+            img if img.is_cuda else img.pin_memory().to(device, non_blocking=True)
+            for img in images
+        ]
+    batch = torch.stack(images)
+    batch = batch.to(device, dtype=IMAGE_DTYPE, memory_format=torch.channels_last,
+                     non_blocking=True)
+    
+    with torch.inference_mode():
+        batch.sub_(IMAGE_MEAN).div_(IMAGE_STD)
+        output = image_model(batch)
+        probabilities = torch.nn.functional.softmax(output.float(), dim=1)
+        # Single device-to-host sync; the (N, 2) reduction is cheap on the CPU
+        probabilities = probabilities.cpu()
+        confidences, pred_classes = probabilities.max(dim=1)
+    
+    return list(zip(pred_classes.tolist(), confidences.tolist(), probabilities.numpy()))
+
+
+# ============ DYNAMIC REQUEST BATCHING ============
+# Concurrent single-image requests share one forward pass
+image_batcher = RequestBatcher(_classify_images)
+
+
+# ============ PREDICTION CACHES ============
+
+def _cache_stats(hits, misses, size):
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": size,
+        "hit_rate": round(hits / total, 4) if total else 0.0
+    }
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss counters."""
+    
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def stats(self):
+        with self._lock:
+            return _cache_stats(self.hits, self.misses, len(self._data))
+
+
+# Panel defect predictions keyed by a hash of the raw image bytes
+image_prediction_cache = LRUCache(maxsize=1024)
+
+
+# Per-thread (1, 7) float32 buffer reused by single-record predictions
+_feature_buffers = threading.local()
+
+
+def _feature_buffer(values):
+    """Fill this thread's preallocated feature buffer with values in place."""
+    buf = getattr(_feature_buffers, "x", None)
+    if buf is None:
+        buf = _feature_buffers.x = np.empty((1, 7), dtype=np.float32)
+    buf[0] = values
+    return buf
+
+
+@functools.lru_cache(maxsize=4096)
+def _predict_efficiency_cached(features):
+    """
+    Cached efficiency loss prediction for a tuple of already rounded features
+    (see _round_efficiency_features).
+    """
+    return _predict_efficiency(_feature_buffer(features))[0]
+
+
+def _round_efficiency_features(values):
+    """
+    Quantize features so repeated telemetry maps to the same cache entry:
+    temperature and humidity to 2 decimals, everything else to 1 decimal.
+    Values go through float() first so numeric strings are accepted, as on the
+    uncached path.
+    """
+    temperature, humidity, *rest = values
+    return (round(float(temperature), 2), round(float(humidity), 2),
+            *(round(float(v), 1) for v in rest))
 
 
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
-    return jsonify({
+    efficiency_cache = _predict_efficiency_cached.cache_info()
+    return ojson({
         "status": "ok" if model is not None else "partial",
         "model_loaded": model is not None,
         "image_classifier_loaded": image_model is not None,
         "device": str(device),
-        "service": "solar-ml-api"
+        "service": "solar-ml-api",
+        "cache": {
+            "efficiency_loss": _cache_stats(
+                efficiency_cache.hits, efficiency_cache.misses, efficiency_cache.currsize
+            ),
+            "panel_defect": image_prediction_cache.stats()
+        }
     })
 
 
@@ -83,36 +350,31 @@ def predict_efficiency_loss():
         "current": float,
         "days_since_installation": int
     }
+    
+    Predictions are cached on rounded inputs; pass ?cache=false to bypass.
     """
     if model is None:
-        return jsonify({"error": "Model not loaded"}), 500
+        return ojson({"error": "Model not loaded"}, 500)
     
     try:
         data = request.json
         
         # Validate required fields
-        required_fields = [
-            "temperature", "humidity", "wind_speed", 
-            "irradiance", "voltage", "current", "days_since_installation"
-        ]
+        missing = REQUIRED_EFFICIENCY_FIELDS.difference(data)
+        if missing:
+            return ojson({"error": f"Missing fields: {', '.join(sorted(missing))}"}, 400)
         
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing field: {field}"}), 400
-        
-        # Create feature array in the same order as training
-        features = np.array([[
-            data["temperature"],
-            data["humidity"],
-            data["wind_speed"],
-            data["irradiance"],
-            data["voltage"],
-            data["current"],
-            data["days_since_installation"]
-        ]])
-        
-        # Make prediction
-        prediction = model.predict(features)[0]
+        # Feature values in the same order as training
+        values = get_efficiency_features(data)
+        
+        # Make prediction. ?cache=false skips the cache and uses the exact inputs.
+        if request.args.get("cache", "true").lower() == "false":
+            prediction = _predict_efficiency(_feature_buffer(values))[0]
+        else:
+            prediction = _predict_efficiency_cached(_round_efficiency_features(values))
+        
+        # Python float so the percent string is formatted from the rounded value
+        efficiency_loss = round(float(prediction), 2)
         
         # Determine status based on efficiency loss
         if prediction < 5:
@@ -128,17 +390,63 @@ def predict_efficiency_loss():
             status = "critical"
             recommendation = "Immediate inspection recommended"
         
-        return jsonify({
+        return ojson({
             "success": True,
-            "efficiency_loss": round(float(prediction), 2),
-            "efficiency_loss_percent": f"{round(float(prediction), 2)}%",
+            "efficiency_loss": efficiency_loss,
+            "efficiency_loss_percent": f"{efficiency_loss}%",
             "status": status,
             "recommendation": recommendation,
             "input_features": data
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
+
+
+def _degradation(temperature, humidity, v_max, v_min, i_max, i_min, days):
+    """
+    Composite degradation index and its stress factors.
+    
+    Returns:
+        Tuple of (degradation_index, thermal_stress, humidity_stress,
+                  electrical_stress, aging_stress)
+    """
+    # Calculate thermal stress (excess temperature over 25°C)
+    thermal_stress = max(0.0, temperature - 25.0)
+    
+    # Humidity stress (scaled 0-1)
+    humidity_stress = humidity / 100.0
+    
+    # Electrical stress (voltage and current instability)
+    voltage_drop = (v_max - v_min) / v_max if v_max > 0 else 0.0
+    current_drop = (i_max - i_min) / i_max if i_max > 0 else 0.0
+    electrical_stress = voltage_drop + current_drop
+    
+    # Aging stress (normalized by max expected lifespan ~25 years)
+    aging_stress = min(1.0, days / (25 * 365))
+    
+    # Calculate composite degradation index
+    degradation_index = (
+        0.30 * thermal_stress +
+        0.20 * humidity_stress +
+        0.30 * electrical_stress +
+        0.20 * aging_stress
+    )
+    
+    # Normalize to 0-1 range
+    degradation_index = min(1.0, max(0.0, degradation_index))
+    
+    return degradation_index, thermal_stress, humidity_stress, electrical_stress, aging_stress
+
+
+if numba is not None:
+    # Explicit signature compiles eagerly at import (cached on disk), so the
+    # first request does not pay for JIT compilation
+    _degradation = numba.njit(
+        numba.types.UniTuple(numba.float64, 5)(*([numba.float64] * 7)),
+        cache=True,
+        fastmath=True
+    )(_degradation)
 
 
 @app.route("/predict/degradation", methods=["POST"])
@@ -160,37 +468,16 @@ def predict_degradation():
     try:
         data = request.json
         
-        # Calculate thermal stress (excess temperature over 25°C)
-        thermal_stress = max(0, data.get("temperature", 25) - 25)
-        
-        # Humidity stress (scaled 0-1)
-        humidity_stress = data.get("humidity", 50) / 100
-        
-        # Electrical stress (voltage and current instability)
-        v_max = data.get("voltage_max", 1)
-        v_min = data.get("voltage_min", 1)
-        i_max = data.get("current_max", 1)
-        i_min = data.get("current_min", 1)
-        
-        voltage_drop = (v_max - v_min) / v_max if v_max > 0 else 0
-        current_drop = (i_max - i_min) / i_max if i_max > 0 else 0
-        electrical_stress = voltage_drop + current_drop
-        
-        # Aging stress (normalized by max expected lifespan ~25 years)
-        days = data.get("days_since_installation", 0)
-        aging_stress = min(1, days / (25 * 365))
-        
-        # Calculate composite degradation index
-        degradation_index = (
-            0.30 * thermal_stress +
-            0.20 * humidity_stress +
-            0.30 * electrical_stress +
-            0.20 * aging_stress
+        degradation_index, thermal_stress, humidity_stress, electrical_stress, aging_stress = _degradation(
+            data.get("temperature", 25),
+            data.get("humidity", 50),
+            data.get("voltage_max", 1),
+            data.get("voltage_min", 1),
+            data.get("current_max", 1),
+            data.get("current_min", 1),
+            data.get("days_since_installation", 0)
         )
         
-        # Normalize to 0-1 range
-        degradation_index = min(1, max(0, degradation_index))
-        
         # Determine status
         if degradation_index < 0.4:
             status = "Healthy"
@@ -202,9 +489,9 @@ def predict_degradation():
             status = "Critical"
             recommendation = "Immediate inspection required"
         
-        return jsonify({
+        return ojson({
             "success": True,
-            "degradation_index": round(float(degradation_index), 3),
+            "degradation_index": round(degradation_index, 3),
             "status": status,
             "recommendation": recommendation,
             "stress_factors": {
@@ -216,7 +503,17 @@ def predict_degradation():
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
+
+
+# Batch status bands: < 5 healthy, < 15 degrading, otherwise critical
+BATCH_STATUS_THRESHOLDS = np.array([5, 15])
+BATCH_STATUS_LABELS = np.array(["healthy", "degrading", "critical"])
+
+
+def _status_lut(predictions):
+    """Map an array of efficiency losses to batch status labels."""
+    return BATCH_STATUS_LABELS[np.searchsorted(BATCH_STATUS_THRESHOLDS, predictions, side="right")]
 
 
 @app.route("/predict/batch", methods=["POST"])
@@ -233,61 +530,58 @@ def predict_batch():
     }
     """
     if model is None:
-        return jsonify({"error": "Model not loaded"}), 500
+        return ojson({"error": "Model not loaded"}, 500)
     
     try:
         data = request.json
         records = data.get("data", [])
         
         results = []
-        for i, record in enumerate(records):
-            features = np.array([[
-                record.get("temperature", 25),
-                record.get("humidity", 50),
-                record.get("wind_speed", 5),
-                record.get("irradiance", 500),
-                record.get("voltage", 30),
-                record.get("current", 8),
-                record.get("days_since_installation", 0)
-            ]])
+        if records:
+            # Build the whole feature matrix and predict in a single call
+            features = np.array(
+                [[record.get(key, default) for key, default in BATCH_FEATURE_DEFAULTS]
+                 for record in records],
+                dtype=np.float32
+            )
+            predictions = _predict_efficiency(features)
             
-            prediction = model.predict(features)[0]
+            # Round and classify the whole batch in numpy. Widen to float64 first
+            # so the rounded values convert to clean Python floats.
+            losses = np.round(predictions.astype(np.float64), 2).tolist()
+            statuses = _status_lut(predictions).tolist()
             
-            results.append({
-                "index": i,
-                "panel_id": record.get("panel_id", f"panel_{i}"),
-                "efficiency_loss": round(float(prediction), 2),
-                "status": "healthy" if prediction < 5 else "degrading" if prediction < 15 else "critical"
-            })
-        
-        return jsonify({
+            results = [
+                {
+                    "index": i,
+                    "panel_id": record.get("panel_id", f"panel_{i}"),
+                    "efficiency_loss": loss,
+                    "status": status
+                }
+                for i, (record, loss, status) in enumerate(zip(records, losses, statuses))
+            ]
+        
+        return ojson({
             "success": True,
             "count": len(results),
             "predictions": results
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 @app.route("/model/info", methods=["GET"])
 def model_info():
     """Get information about the loaded model"""
     if model is None:
-        return jsonify({"error": "Model not loaded"}), 500
+        return ojson({"error": "Model not loaded"}, 500)
     
-    return jsonify({
+    return ojson({
         "model_type": type(model).__name__,
+        "runtime": "onnxruntime" if onnx_session is not None else "sklearn",
         "n_estimators": getattr(model, "n_estimators", None),
-        "features": [
-            "temperature",
-            "humidity", 
-            "wind_speed",
-            "irradiance",
-            "voltage",
-            "current",
-            "days_since_installation"
-        ],
+        "features": list(EFFICIENCY_FEATURES),
         "target": "efficiency_loss",
         "image_classifier": {
             "loaded": image_model is not None,
@@ -312,17 +606,17 @@ def predict_panel_defect():
     - JSON with 'image_base64' field (base64 encoded image)
     """
     if image_model is None:
-        return jsonify({"error": "Image classifier not loaded"}), 500
+        return ojson({"error": "Image classifier not loaded"}, 500)
     
     try:
-        img = None
+        image_bytes = None
         
         # Check for file upload
         if 'image' in request.files:
             file = request.files['image']
             if file.filename == '':
-                return jsonify({"error": "No file selected"}), 400
-            img = Image.open(file.stream).convert("RGB")
+                return ojson({"error": "No file selected"}, 400)
+            image_bytes = file.stream.read()
         
         # Check for base64 encoded image
         elif request.is_json and 'image_base64' in request.json:
@@ -330,20 +624,25 @@ def predict_panel_defect():
             # Remove data URL prefix if present
             if ',' in image_data:
                 image_data = image_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            # Reject oversized payloads before decoding (4 base64 chars -> 3 bytes)
+            if len(image_data) // 4 * 3 > MAX_IMAGE_BYTES:
+                return ojson({"error": f"Image exceeds {MAX_IMAGE_BYTES // (1024 * 1024)} MB limit"}, 413)
+            image_bytes = base64.b64decode(image_data, validate=False)
         
         else:
-            return jsonify({"error": "No image provided. Use 'image' file or 'image_base64' JSON field"}), 400
-        
-        # Preprocess image
-        img_tensor = image_transform(img).unsqueeze(0).to(device)
+            return ojson({"error": "No image provided. Use 'image' file or 'image_base64' JSON field"}, 400)
         
-        # Run inference
-        with torch.no_grad():
-            output = image_model(img_tensor)
-            probabilities = torch.nn.functional.softmax(output, dim=1)[0]
-            pred_class = torch.argmax(output, dim=1).item()
+        # Run inference (batched with other concurrent requests)
+        cache_key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        cached = image_prediction_cache.get(cache_key)
+        if cached is not None:
+            pred_class, confidence, probabilities = cached
+        else:
+            img_tensor = _load_image(image_bytes)
+            pred_class, confidence, probabilities = image_batcher.submit(img_tensor).result(
+                timeout=RESULT_TIMEOUT_S
+            )
+            image_prediction_cache.put(cache_key, (pred_class, confidence, probabilities))
         
         # Map prediction to labels
         # IMPORTANT: ImageFolder sorts classes alphabetically!
@@ -351,7 +650,7 @@ def predict_panel_defect():
         label_map = {0: "DEFECTIVE", 1: "NORMAL"}
         status_map = {0: "bad", 1: "good"}
         
-        confidence = float(probabilities[pred_class]) * 100
+        confidence = confidence * 100
         
         # Generate recommendations based on result
         if pred_class == 1:  # Normal (Class 1 = good folder)
@@ -370,7 +669,7 @@ def predict_panel_defect():
                 severity = "medium"
             action_required = True
         
-        return jsonify({
+        return ojson({
             "success": True,
             "prediction": {
                 "label": label_map[pred_class],
@@ -381,8 +680,8 @@ def predict_panel_defect():
             },
             "probabilities": {
                 # Class 0 = defective (bad), Class 1 = normal (good)
-                "defective": round(float(probabilities[0]) * 100, 2),
-                "normal": round(float(probabilities[1]) * 100, 2)
+                "defective": round(probabilities[0] * 100, 2),
+                "normal": round(probabilities[1] * 100, 2)
             },
             "analysis": {
                 "severity": severity,
@@ -397,7 +696,7 @@ def predict_panel_defect():
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 @app.route("/predict/panel-defect/batch", methods=["POST"])
@@ -408,55 +707,67 @@ def predict_panel_defect_batch():
     Accepts multipart/form-data with multiple 'images' files
     """
     if image_model is None:
-        return jsonify({"error": "Image classifier not loaded"}), 500
+        return ojson({"error": "Image classifier not loaded"}, 500)
     
     try:
         if 'images' not in request.files:
-            return jsonify({"error": "No images provided"}), 400
+            return ojson({"error": "No images provided"}, 400)
         
         files = request.files.getlist('images')
         if len(files) == 0:
-            return jsonify({"error": "No images provided"}), 400
+            return ojson({"error": "No images provided"}, 400)
         
-        results = []
+        results = [None] * len(files)
         normal_count = 0
         defective_count = 0
         
-        for idx, file in enumerate(files):
+        # Class 0 = bad (defective), Class 1 = good (normal) - alphabetical order
+        label_map = {0: "DEFECTIVE", 1: "NORMAL"}
+        
+        # Decode and classify MAX_BATCH files at a time so memory stays bounded;
+        # a failed chunk only marks its own files as errors
+        for start in range(0, len(files), MAX_BATCH):
+            images = []
+            image_indices = []
+            for idx in range(start, min(start + MAX_BATCH, len(files))):
+                try:
+                    images.append(_load_image(files[idx].stream.read()))
+                    image_indices.append(idx)
+                except Exception as e:
+                    results[idx] = {
+                        "index": idx,
+                        "filename": files[idx].filename,
+                        "error": str(e)
+                    }
+            
             try:
-                img = Image.open(file.stream).convert("RGB")
-                img_tensor = image_transform(img).unsqueeze(0).to(device)
-                
-                with torch.no_grad():
-                    output = image_model(img_tensor)
-                    probabilities = torch.nn.functional.softmax(output, dim=1)[0]
-                    pred_class = torch.argmax(output, dim=1).item()
-                
-                # Class 0 = bad (defective), Class 1 = good (normal) - alphabetical order
-                label_map = {0: "DEFECTIVE", 1: "NORMAL"}
-                confidence = float(probabilities[pred_class]) * 100
+                predictions = _classify_images(images)
+            except Exception as e:
+                for idx in image_indices:
+                    results[idx] = {
+                        "index": idx,
+                        "filename": files[idx].filename,
+                        "error": str(e)
+                    }
+                continue
+            
+            for idx, (pred_class, confidence, _) in zip(image_indices, predictions):
+                confidence = confidence * 100
                 
                 if pred_class == 1:  # Normal
                     normal_count += 1
                 else:  # Defective (Class 0)
                     defective_count += 1
                 
-                results.append({
+                results[idx] = {
                     "index": idx,
-                    "filename": file.filename,
+                    "filename": files[idx].filename,
                     "prediction": label_map[pred_class],
                     "confidence": round(confidence, 2),
                     "is_defective": pred_class == 0  # Class 0 is defective
-                })
-                
-            except Exception as e:
-                results.append({
-                    "index": idx,
-                    "filename": file.filename,
-                    "error": str(e)
-                })
+                }
         
-        return jsonify({
+        return ojson({
             "success": True,
             "total_processed": len(results),
             "summary": {
@@ -468,7 +779,7 @@ def predict_panel_defect_batch():
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 # ============ TILT OPTIMIZATION ENDPOINT ============
@@ -500,7 +811,12 @@ def predict_optimal_tilt():
         required_fields = ["ghi", "latitude", "hour"]
         for field in required_fields:
             if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+                return ojson({"error": f"Missing required field: {field}"}, 400)
+        
+        tilt_min = int(data.get("tilt_min", 0))
+        tilt_max = int(data.get("tilt_max", 60))
+        if tilt_max < tilt_min:
+            return ojson({"error": "tilt_max must be >= tilt_min"}, 400)
         
         # Get optimization result
         result = get_optimization_result(
@@ -513,18 +829,19 @@ def predict_optimal_tilt():
             voltage=float(data.get("voltage", 38)),
             current=float(data.get("current", 8)),
             days_since_installation=int(data.get("days_since_installation", 365)),
-            tilt_min=int(data.get("tilt_min", 0)),
-            tilt_max=int(data.get("tilt_max", 60))
+            tilt_min=tilt_min,
+            tilt_max=tilt_max,
+            return_curve=True
         )
         
-        return jsonify({
+        return ojson({
             "success": True,
             "optimization": result,
             "source": "ml-model"
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 @app.route("/predict/tilt-optimize/quick", methods=["GET"])
@@ -547,7 +864,7 @@ def quick_tilt_optimize():
             temperature=temperature
         )
         
-        return jsonify({
+        return ojson({
             "success": True,
             "optimal_tilt": result["optimal_tilt"],
             "estimated_energy": result["estimated_energy"],
@@ -556,7 +873,7 @@ def quick_tilt_optimize():
         })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+"""
+Tilt Sweep Kernels
+Numerical core of the tilt optimizer, compiled with Numba when it is installed
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from solar_utils.solar_geometry import DEG2RAD
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _sweep_tilts_loop(ghi, solar_elev, loss, tilt_min, eff, net):
+    """
+    Evaluate effective irradiance and net energy for the integer tilts
+    tilt_min, tilt_min + 1, ... (one per entry of eff/net, filled in place).
+    The best tilt is found in closed form by the caller.
+    """
+    for i in range(eff.shape[0]):
+        # cos is even, so the angle difference needs no abs()
+        e = ghi * math.cos((tilt_min + i - solar_elev) * DEG2RAD)
+        if e < 0.0:
+            e = 0.0
+        eff[i] = e
+        net[i] = e * (1.0 - loss)
+
+
+@lru_cache(maxsize=8)
+def _tilt_offsets(n):
+    """Read-only float64 array 0, 1, ..., n - 1."""
+    offsets = np.arange(n, dtype=np.float64)
+    offsets.flags.writeable = False
+    return offsets
+
+
+def _sweep_tilts_numpy(ghi, solar_elev, loss, tilt_min, eff, net):
+    """NumPy version of _sweep_tilts_loop, used when Numba is not installed."""
+    # Every step writes into the caller's buffers
+    np.add(_tilt_offsets(eff.shape[0]), tilt_min - solar_elev, out=eff)
+    eff *= DEG2RAD
+    np.cos(eff, out=eff)
+    eff *= ghi
+    np.maximum(eff, 0.0, out=eff)
+    np.multiply(eff, 1 - loss, out=net)
+
+
+if numba is not None:
+    sweep_tilts = numba.njit(
+        "void(float64, float64, float64, int64, float64[::1], float64[::1])",
+        cache=True,
+        fastmath=True
+    )(_sweep_tilts_loop)
+else:
+    sweep_tilts = _sweep_tilts_numpy
+
+
+def _traverse_forest_loop(x, feature, threshold, left, right, value):
+    """
+    Average prediction of a regression forest stored as flat per-tree arrays
+    (see tilt_optimizer._flatten_forest). Leaves have left == -1.
+    """
+    n_trees = feature.shape[0]
+    total = 0.0
+    for t in range(n_trees):
+        node = 0
+        while left[t, node] != -1:
+            if x[feature[t, node]] <= threshold[t, node]:
+                node = left[t, node]
+            else:
+                node = right[t, node]
+        total += value[t, node]
+    return total / n_trees
+
+
+# Only worth using compiled; without Numba callers keep the sklearn model
+traverse_forest = None
+if numba is not None:
+    traverse_forest = numba.njit(
+        "float64(float64[::1], int32[:, ::1], float64[:, ::1], int32[:, ::1], int32[:, ::1], float64[:, ::1])",
+        cache=True
+    )(_traverse_forest_loop)
@@ -3,10 +3,28 @@ Tilt Angle Optimizer
 Uses ML model predictions to find the optimal solar panel tilt angle
 """
 
+import logging
+import math
 import os
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+
 import joblib
 import numpy as np
-import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+from batching import RESULT_TIMEOUT_S, RequestBatcher
+from solar_utils import effective_irradiance, solar_elevation_angle
+
+from ._kernels import sweep_tilts, traverse_forest
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
 
 # Get the directory where this file is located
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,17 +32,149 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Load the efficiency loss model
 MODEL_PATH = os.path.join(BASE_DIR, "efficiency_loss_model.pkl")
 rf_model = None
+# Column order of the feature vectors that get_optimization_result builds
+FEATURE_NAMES = (
+    "temperature",
+    "humidity",
+    "wind_speed",
+    "irradiance",
+    "voltage",
+    "current",
+    "days_since_installation",
+)
 
 try:
+    # sklearn copies the tree arrays into its own buffers on unpickling, so
+    # mmap_mode would not share anything; forked workers share the model only
+    # copy-on-write after a gunicorn preload
     rf_model = joblib.load(MODEL_PATH)
-    print(f"✅ Tilt optimizer model loaded from {MODEL_PATH}")
+    # Predict on plain arrays instead of a per-call DataFrame. Check the
+    # training column order matches FEATURE_NAMES, then drop the names so
+    # sklearn does not warn about unnamed input on every call.
+    if hasattr(rf_model, "feature_names_in_"):
+        if tuple(rf_model.feature_names_in_) != FEATURE_NAMES:
+            raise ValueError(
+                f"model features {list(rf_model.feature_names_in_)} do not match {list(FEATURE_NAMES)}"
+            )
+        del rf_model.feature_names_in_
+    # Single-row predictions are far cheaper than joblib's worker dispatch, and
+    # inputs are already float32 C-contiguous arrays, so skip sklearn's re-validation
+    if isinstance(rf_model, (RandomForestRegressor, ExtraTreesRegressor)):
+        rf_model.n_jobs = 1
+        rf_model._validate_X_predict = lambda X: X
+    logger.info("✅ Tilt optimizer model loaded from %s", MODEL_PATH)
 except Exception as e:
-    print(f"⚠️ Could not load tilt optimizer model: {e}")
+    logger.warning("⚠️ Could not load tilt optimizer model: %s", e)
+    rf_model = None
+
+# ONNX Runtime version of the same model, converted once and cached next to the
+# .pkl. ml_api.py serves the efficiency endpoints from this session as well.
+ONNX_MODEL_PATH = os.path.join(BASE_DIR, "efficiency_loss_model.onnx")
+onnx_session = None
+onnx_input_name = None
+
+if rf_model is not None and ort is not None:
+    try:
+        from export_onnx_model import load_onnx_session
+
+        onnx_session, onnx_input_name = load_onnx_session(rf_model, ONNX_MODEL_PATH, MODEL_PATH)
+        logger.info("✅ Tilt optimizer using ONNX Runtime model from %s", ONNX_MODEL_PATH)
+    except Exception as e:
+        logger.warning("⚠️ ONNX conversion failed, using sklearn model: %s", e)
+        onnx_session = None
+
+
+def _flatten_forest(model):
+    """
+    Copy the trees of a single-output forest regressor into contiguous
+    (n_trees, max_nodes) arrays: feature, threshold, left, right, value.
+    Unused trailing nodes are padded as leaves.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    shape = (len(trees), max(tree.node_count for tree in trees))
+
+    feature = np.zeros(shape, dtype=np.int32)
+    # Thresholds stay float64: sklearn compares float32 inputs against float64
+    # thresholds, and rounding them could flip splits
+    threshold = np.zeros(shape, dtype=np.float64)
+    left = np.full(shape, -1, dtype=np.int32)
+    right = np.full(shape, -1, dtype=np.int32)
+    value = np.zeros(shape, dtype=np.float64)
+
+    for t, tree in enumerate(trees):
+        n = tree.node_count
+        feature[t, :n] = np.maximum(tree.feature, 0)  # leaves store -2
+        threshold[t, :n] = tree.threshold
+        left[t, :n] = tree.children_left
+        right[t, :n] = tree.children_right
+        value[t, :n] = tree.value[:, 0, 0]
+
+    return feature, threshold, left, right, value
+
+
+# Flattened forest for the compiled traversal, used when ONNX Runtime is not
+forest_arrays = None
+
+if (rf_model is not None and onnx_session is None and traverse_forest is not None
+        and isinstance(rf_model, (RandomForestRegressor, ExtraTreesRegressor))
+        and rf_model.n_outputs_ == 1):
+    try:
+        forest_arrays = _flatten_forest(rf_model)
+        logger.info(
+            "✅ Tilt optimizer using compiled forest traversal (%d trees)", len(rf_model.estimators_)
+        )
+    except Exception as e:
+        logger.warning("⚠️ Could not flatten forest, using sklearn model: %s", e)
+        forest_arrays = None
+
+
+# Quantization step per feature (temperature, humidity, wind_speed, irradiance,
+# voltage, current, days_since_installation) for the prediction cache, about
+# the resolution telemetry is reported at, so repeated readings share a cache
+# entry. The forest is piecewise constant, so snapping can still cross a split:
+# over 3000 random feature vectors the loss moved by up to 0.85 percentage
+# points and the estimated energy by up to 0.9% (p99 0.22%).
+LOSS_CACHE_STEPS = (0.1, 0.5, 0.1, 1.0, 0.1, 0.01, 1.0)
+
+
+def _model_predict_losses(feature_vectors: list) -> list:
+    """Run the ONNX, flattened-forest or sklearn model on a list of feature vectors."""
+    X = np.asarray(feature_vectors, dtype=np.float32)
+    if onnx_session is not None:
+        losses = onnx_session.run(None, {onnx_input_name: X})[0].ravel()
+    elif forest_arrays is not None:
+        losses = [traverse_forest(row, *forest_arrays) for row in X.astype(np.float64)]
+    else:
+        losses = rf_model.predict(X)
+    return np.clip(losses, 0.0, 1.0).tolist()
+
+
+# Concurrent requests that miss the cache share one (B, 7) model call
+loss_batcher = RequestBatcher(_model_predict_losses)
+
+
+def predict_loss_async(feature_vector: list) -> Future:
+    """
+    Queue a feature vector for the next batched model call.
+    
+    Returns:
+        Future resolving to the predicted efficiency loss (0-1)
+    """
+    return loss_batcher.submit(feature_vector)
+
+
+@lru_cache(maxsize=4096)
+def _predict_loss_cached(t_q, h_q, w_q, i_q, v_q, c_q, d_q) -> float:
+    """Cached model prediction for a feature vector quantized by LOSS_CACHE_STEPS."""
+    quantized = (t_q, h_q, w_q, i_q, v_q, c_q, d_q)
+    future = predict_loss_async([q * step for q, step in zip(quantized, LOSS_CACHE_STEPS)])
+    return future.result(timeout=RESULT_TIMEOUT_S)
 
 
 def predict_loss(feature_vector: list) -> float:
     """
     Predict efficiency loss using the Random Forest model.
+    Features are snapped to LOSS_CACHE_STEPS and the result is cached.
     
     Args:
         feature_vector: [temperature, humidity, wind_speed, irradiance, 
@@ -38,32 +188,32 @@ def predict_loss(feature_vector: list) -> float:
         return 0.15
     
     try:
-        X = pd.DataFrame(
-            [feature_vector],
-            columns=rf_model.feature_names_in_
-        )
-        loss = rf_model.predict(X)[0]
-        return max(0, min(loss, 1))
-    except Exception as e:
-        print(f"Prediction error: {e}")
+        quantized = (int(round(x / step)) for x, step in zip(feature_vector, LOSS_CACHE_STEPS))
+        return _predict_loss_cached(*quantized)
+    except Exception:
+        logger.exception("Prediction error")
         return 0.15
 
 
-def solar_elevation_angle(latitude: float, hour: float) -> float:
-    """
-    Calculate the solar elevation angle based on latitude and hour of day.
-    """
-    max_elevation = 90 - abs(latitude)
-    elevation = max_elevation * np.sin(np.pi * (hour - 6) / 12)
-    return max(elevation, 0)
+# Per-thread effective irradiance / net energy buffers for
+# get_optimization_result's tilt curve
+_curve_buffers = threading.local()
 
 
-def effective_irradiance(ghi: float, tilt: float, solar_elevation: float) -> float:
-    """
-    Calculate effective irradiance on a tilted surface.
-    """
-    angle_diff = np.radians(abs(tilt - solar_elevation))
-    return max(ghi * np.cos(angle_diff), 0)
+def _curve_buffer(n: int) -> tuple:
+    """Return this thread's preallocated (eff, net) float64 buffers of length n."""
+    buffers = getattr(_curve_buffers, "arrays", None)
+    if buffers is None or buffers[0].shape[0] != n:
+        buffers = _curve_buffers.arrays = (np.empty(n), np.empty(n))
+    return buffers
+
+
+@lru_cache(maxsize=32)
+def _tilt_range(tilt_min: int, tilt_max: int) -> np.ndarray:
+    """Read-only array of the integer tilts tilt_min..tilt_max."""
+    tilts = np.arange(tilt_min, tilt_max + 1)
+    tilts.flags.writeable = False
+    return tilts
 
 
 def find_best_tilt(
@@ -72,7 +222,9 @@ def find_best_tilt(
     hour: float,
     feature_vector: list,
     tilt_min: int = 0,
-    tilt_max: int = 60
+    tilt_max: int = 60,
+    return_curve: bool = False,
+    curve_out: tuple = None
 ) -> tuple:
     """
     Find the optimal tilt angle for maximum energy output.
@@ -84,33 +236,54 @@ def find_best_tilt(
         feature_vector: Environmental conditions for loss prediction
         tilt_min: Minimum tilt angle to consider
         tilt_max: Maximum tilt angle to consider
+        return_curve: Also evaluate every tilt in the range
+        curve_out: Optional (effective_irradiance, net_energy) float64 arrays
+                   with one entry per tilt to write the curve into; new
+                   arrays are allocated when omitted
     
     Returns:
-        Tuple of (best_tilt_angle, estimated_net_energy)
+        Tuple of (best_tilt_angle, estimated_net_energy, solar_elevation,
+                  loss, curve) where curve is (tilts, effective_irradiance,
+                  net_energy) NumPy arrays with one entry per tilt, or None
+                  unless return_curve is set
     """
+    if tilt_max < tilt_min:
+        raise ValueError("tilt_max must be >= tilt_min")
+
+    if return_curve and curve_out is None:
+        n = tilt_max - tilt_min + 1
+        curve_out = (np.empty(n), np.empty(n))
+
     solar_elev = solar_elevation_angle(latitude, hour)
     loss = predict_loss(feature_vector)
     loss = min(loss, 0.8)  # Cap loss at 80%
 
-    best_tilt = None
-    best_energy = -1
-    all_results = []
+    if ghi <= 0:
+        # Night: every tilt yields zero energy, so the first one wins the sweep
+        curve = None
+        if return_curve:
+            eff_irr, net_energy = curve_out
+            eff_irr.fill(0.0)
+            net_energy.fill(0.0)
+            curve = (_tilt_range(tilt_min, tilt_max), eff_irr, net_energy)
+        return tilt_min, 0.0, solar_elev, loss, curve
 
-    for tilt in range(tilt_min, tilt_max + 1):
-        eff_irr = effective_irradiance(ghi, tilt, solar_elev)
-        net_energy = eff_irr * (1 - loss)
-        
-        all_results.append({
-            'tilt': tilt,
-            'effective_irradiance': round(eff_irr, 2),
-            'net_energy': round(net_energy, 2)
-        })
+    # The loss is the same for every tilt, so net energy peaks at the tilt
+    # closest to the solar elevation (the lower one on ties, like a sweep
+    # keeping the first maximum).
+    best_tilt = min(max(math.ceil(solar_elev - 0.5), tilt_min), tilt_max)
+    best_energy = effective_irradiance(ghi, best_tilt, solar_elev) * (1 - loss)
 
-        if net_energy > best_energy:
-            best_energy = net_energy
-            best_tilt = tilt
+    curve = None
+    if return_curve:
+        # Evaluate every tilt in one compiled (or vectorized) pass
+        eff_irr, net_energy = curve_out
+        sweep_tilts(
+            float(ghi), float(solar_elev), float(loss), int(tilt_min), eff_irr, net_energy
+        )
+        curve = (_tilt_range(tilt_min, tilt_max), eff_irr, net_energy)
 
-    return best_tilt, best_energy, solar_elev, loss, all_results
+    return best_tilt, best_energy, solar_elev, loss, curve
 
 
 def get_optimization_result(
@@ -124,10 +297,12 @@ def get_optimization_result(
     current: float = 8.0,
     days_since_installation: int = 365,
     tilt_min: int = 0,
-    tilt_max: int = 60
+    tilt_max: int = 60,
+    return_curve: bool = False
 ) -> dict:
     """
     Get a complete optimization result with all details.
+    The sampled 'tilt_curve' is only included when return_curve is set.
     """
     feature_vector = [
         temperature,
@@ -139,25 +314,33 @@ def get_optimization_result(
         days_since_installation
     ]
     
-    best_tilt, best_energy, solar_elev, loss, all_results = find_best_tilt(
+    # The curve is converted to lists below, so this thread's buffers can be reused
+    curve_out = None
+    if return_curve and tilt_max >= tilt_min:
+        curve_out = _curve_buffer(tilt_max - tilt_min + 1)
+    
+    best_tilt, best_energy, solar_elev, loss, curve = find_best_tilt(
         ghi=ghi,
         latitude=latitude,
         hour=hour,
         feature_vector=feature_vector,
         tilt_min=tilt_min,
-        tilt_max=tilt_max
+        tilt_max=tilt_max,
+        return_curve=return_curve,
+        curve_out=curve_out
     )
     
     # Get energy at current/default tilt for comparison
     default_tilt = int(abs(latitude))  # Common rule of thumb
-    default_energy = next(
-        (r['net_energy'] for r in all_results if r['tilt'] == default_tilt),
-        best_energy * 0.9
+    default_energy = (
+        round(effective_irradiance(ghi, default_tilt, solar_elev) * (1 - loss), 2)
+        if tilt_min <= default_tilt <= tilt_max
+        else best_energy * 0.9
     )
     
     improvement = ((best_energy - default_energy) / default_energy * 100) if default_energy > 0 else 0
     
-    return {
+    result = {
         'optimal_tilt': best_tilt,
         'estimated_energy': round(best_energy, 2),
         'solar_elevation': round(solar_elev, 2),
@@ -173,6 +356,16 @@ def get_optimization_result(
             'temperature': temperature,
             'humidity': humidity,
             'wind_speed': wind_speed
-        },
-        'tilt_curve': all_results[::5]  # Every 5 degrees for chart
+        }
     }
+    
+    if curve is not None:
+        tilts, eff_irr, net_energy = curve
+        # Every 5 degrees for chart, as parallel arrays rather than one dict per point
+        result['tilt_curve'] = {
+            'tilts': tilts[::5].tolist(),
+            'effective_irradiance': np.round(eff_irr[::5], 2).tolist(),
+            'net_energy': np.round(net_energy[::5], 2).tolist()
+        }
+    
+    return result
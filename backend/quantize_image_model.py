@@ -0,0 +1,66 @@
+"""
+Quantize the panel defect classifier to int8 for CPU inference
+Uses FX graph mode post-training static quantization, calibrated on a folder
+of sample panel images, and saves a TorchScript model that ml_api.py loads
+automatically when running on CPU.
+
+Usage: python quantize_image_model.py <calibration_image_dir>
+"""
+
+import os
+import sys
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from torchvision import transforms, models
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "pv_classifier.pth")
+INT8_MODEL_PATH = os.path.join(BASE_DIR, "pv_classifier_int8.pt")
+MAX_CALIBRATION_IMAGES = 200
+
+calibration_dir = sys.argv[1]
+
+# Transforms (same as training)
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406],
+                         [0.229, 0.224, 0.225])
+])
+
+# Model
+model = models.resnet18(weights=None)
+model.fc = nn.Linear(model.fc.in_features, 2)
+model.load_state_dict(torch.load(MODEL_PATH, map_location="cpu"))
+model.eval()
+
+# "x86" picks the fbgemm/onednn int8 kernels
+example_inputs = (torch.randn(1, 3, 224, 224),)
+prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), example_inputs)
+
+# Calibrate activation ranges on sample images
+image_paths = []
+for root, _, filenames in os.walk(calibration_dir):
+    for filename in sorted(filenames):
+        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            image_paths.append(os.path.join(root, filename))
+image_paths = image_paths[:MAX_CALIBRATION_IMAGES]
+
+with torch.no_grad():
+    for path in image_paths:
+        img = transform(Image.open(path).convert("RGB")).unsqueeze(0)
+        prepared(img)
+
+quantized = convert_fx(prepared)
+
+# Save as TorchScript so ml_api.py can load it without the FX graph code
+with torch.no_grad():
+    scripted = torch.jit.trace(quantized, example_inputs)
+scripted = torch.jit.freeze(scripted)
+torch.jit.save(scripted, INT8_MODEL_PATH)
+
+print(f"✅ Calibrated on {len(image_paths)} images")
+print(f"✅ Saved int8 model to {INT8_MODEL_PATH}")
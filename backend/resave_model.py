@@ -0,0 +1,23 @@
+"""
+Re-save the efficiency loss model for fast loading
+Rewrites efficiency_loss_model.pkl uncompressed with pickle protocol 5, so
+ml_api.py and the tilt optimizer load it at startup without decompressing
+the tree arrays.
+
+Usage: python resave_model.py
+"""
+
+import os
+import joblib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "efficiency_loss_model.pkl")
+
+model = joblib.load(MODEL_PATH)
+
+# Write next to the original first so a failed dump leaves the model intact
+tmp_path = MODEL_PATH + ".tmp"
+joblib.dump(model, tmp_path, compress=0, protocol=5)
+os.replace(tmp_path, MODEL_PATH)
+
+print(f"✅ Re-saved model to {MODEL_PATH} (uncompressed, protocol 5)")
@@ -3,28 +3,40 @@ Solar Geometry Calculations
 Provides functions for calculating solar position and effective irradiance
 """
 
+import math
+
 import numpy as np
+from numpy.typing import ArrayLike
+
+DEG2RAD = math.pi / 180
 
 
-def solar_elevation_angle(latitude: float, hour: float) -> float:
+def solar_elevation_angle(latitude: ArrayLike, hour: ArrayLike):
     """
     Calculate the solar elevation angle based on latitude and hour of day.
+    Accepts scalars or arrays; arrays broadcast against each other.
     
     Args:
         latitude: Location latitude in degrees
         hour: Hour of day (0-24, where 12 is solar noon)
     
     Returns:
-        Solar elevation angle in degrees (0-90)
+        Solar elevation angle in degrees (0-90), an array for array inputs
     """
-    max_elevation = 90 - abs(latitude)
-    elevation = max_elevation * np.sin(np.pi * (hour - 6) / 12)
-    return max(elevation, 0)
+    if isinstance(latitude, (int, float)) and isinstance(hour, (int, float)):
+        max_elevation = 90 - abs(latitude)
+        elevation = max_elevation * math.sin(math.pi * (hour - 6) / 12)
+        return elevation if elevation > 0.0 else 0.0
 
+    elevation = (90 - np.abs(latitude)) * np.sin(np.pi * (np.asarray(hour) - 6) / 12)
+    return np.maximum(elevation, 0.0)
 
-def effective_irradiance(ghi: float, tilt: float, solar_elevation: float) -> float:
+
+def effective_irradiance(ghi: ArrayLike, tilt: ArrayLike, solar_elevation: ArrayLike):
     """
     Calculate effective irradiance on a tilted surface.
+    Accepts scalars or arrays, e.g. a (24, 1) column of hourly elevations
+    against a (61,) row of tilts evaluates the whole grid in one call.
     
     Args:
         ghi: Global Horizontal Irradiance in W/m²
@@ -32,7 +44,14 @@ def effective_irradiance(ghi: float, tilt: float, solar_elevation: float) -> flo
         solar_elevation: Solar elevation angle in degrees
     
     Returns:
-        Effective irradiance on the tilted surface in W/m²
+        Effective irradiance on the tilted surface in W/m², an array for
+        array inputs
     """
-    angle_diff = np.radians(abs(tilt - solar_elevation))
-    return max(ghi * np.cos(angle_diff), 0)
+    if (isinstance(ghi, (int, float)) and isinstance(tilt, (int, float))
+            and isinstance(solar_elevation, (int, float))):
+        angle_diff = abs(tilt - solar_elevation) * DEG2RAD
+        irradiance = ghi * math.cos(angle_diff)
+        return irradiance if irradiance > 0.0 else 0.0
+
+    irradiance = np.multiply(ghi, np.cos(np.subtract(tilt, solar_elevation) * DEG2RAD))
+    return np.maximum(irradiance, 0.0)
@@ -418,18 +418,16 @@ async function optimizeTiltAngle(data) {
     // Find best tilt
     let bestTilt = Math.round(solarElevation);
     let bestEnergy = 0;
-    const tiltCurve = [];
+    const tiltCurve = { tilts: [], effective_irradiance: [], net_energy: [] };
     
     for (let tilt = tiltMin; tilt <= tiltMax; tilt += 5) {
       const angleDiff = Math.abs(tilt - solarElevation) * (Math.PI / 180);
       const effectiveIrr = ghi * Math.cos(angleDiff);
       const netEnergy = Math.max(0, effectiveIrr * (1 - efficiencyLoss));
       
-      tiltCurve.push({
-        tilt,
-        effective_irradiance: Math.round(effectiveIrr * 100) / 100,
-        net_energy: Math.round(netEnergy * 100) / 100
-      });
+      tiltCurve.tilts.push(tilt);
+      tiltCurve.effective_irradiance.push(Math.round(effectiveIrr * 100) / 100);
+      tiltCurve.net_energy.push(Math.round(netEnergy * 100) / 100);
       
       if (netEnergy > bestEnergy) {
         bestEnergy = netEnergy;
@@ -439,8 +437,10 @@ async function optimizeTiltAngle(data) {
     
     // Default tilt (latitude-based rule of thumb)
     const defaultTilt = Math.round(Math.abs(latitude));
-    const defaultEntry = tiltCurve.find(t => t.tilt === defaultTilt) || tiltCurve[0];
-    const defaultEnergy = defaultEntry ? defaultEntry.net_energy : bestEnergy * 0.9;
+    const defaultIdx = tiltCurve.tilts.indexOf(defaultTilt);
+    const defaultEnergy = tiltCurve.net_energy.length > 0
+      ? tiltCurve.net_energy[defaultIdx >= 0 ? defaultIdx : 0]
+      : bestEnergy * 0.9;
     
     const improvement = defaultEnergy > 0 
       ? ((bestEnergy - defaultEnergy) / defaultEnergy * 100) 
@@ -0,0 +1,9 @@
+"""
+WSGI entry point for the Solar ML API
+
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from ml_api import app
+
+__all__ = ["app"]
@@ -482,17 +482,18 @@ export const TiltOptimizer: React.FC = () => {
                 </div>
 
                 {/* Tilt Curve */}
-                {result.mlOptimization.tiltCurve && result.mlOptimization.tiltCurve.length > 0 && (
+                {result.mlOptimization.tiltCurve && result.mlOptimization.tiltCurve.tilts.length > 0 && (
                   <div className="bg-slate-800/50 rounded-2xl p-6 border border-slate-700">
                     <div className="flex items-center gap-2 mb-4">
                       <BarChart3 className="w-5 h-5 text-purple-400" />
                       <h3 className="text-lg font-semibold text-white">Energy vs Tilt Angle</h3>
                     </div>
                     <div className="flex items-end gap-2 h-48">
-                      {result.mlOptimization.tiltCurve.map((point, idx) => {
-                        const maxEnergy = Math.max(...result.mlOptimization.tiltCurve!.map(p => p.net_energy));
-                        const height = (point.net_energy / maxEnergy) * 100;
-                        const isOptimal = point.tilt === result.mlOptimization.optimalTilt;
+                      {result.mlOptimization.tiltCurve.tilts.map((tilt, idx) => {
+                        const { net_energy } = result.mlOptimization.tiltCurve!;
+                        const maxEnergy = Math.max(...net_energy);
+                        const height = (net_energy[idx] / maxEnergy) * 100;
+                        const isOptimal = tilt === result.mlOptimization.optimalTilt;
                         
                         return (
                           <div key={idx} className="flex-1 flex flex-col items-center gap-1">
@@ -505,7 +506,7 @@ export const TiltOptimizer: React.FC = () => {
                               style={{ height: `${height}%` }}
                             />
                             <span className={`text-xs ${isOptimal ? 'text-amber-400 font-bold' : 'text-slate-500'}`}>
-                              {point.tilt}°
+                              {tilt}°
                             </span>
                           </div>
                         );
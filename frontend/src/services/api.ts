@@ -456,11 +456,11 @@ export interface TiltOptimizationResult {
     improvementPercent: number;
     defaultTilt: number;
     defaultEnergy: number;
-    tiltCurve?: Array<{
-      tilt: number;
-      effective_irradiance: number;
-      net_energy: number;
-    }>;
+    tiltCurve?: {
+      tilts: number[];
+      effective_irradiance: number[];
+      net_energy: number[];
+    };
   };
   conditions: {
     ghi: number;
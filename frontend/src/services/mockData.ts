@@ -400,11 +400,11 @@ export interface MockTiltResult {
     improvementPercent: number;
     defaultTilt: number;
     defaultEnergy: number;
-    tiltCurve?: Array<{
-      tilt: number;
-      effective_irradiance: number;
-      net_energy: number;
-    }>;
+    tiltCurve?: {
+      tilts: number[];
+      effective_irradiance: number[];
+      net_energy: number[];
+    };
   };
   conditions: {
     ghi: number;
@@ -477,16 +477,18 @@ export function mockOptimizeTilt(input: MockTiltInput): MockTiltResult {
     ((optimalEnergy - currentEnergy) / currentEnergy) * 100 : 0;
   
   // Generate tilt curve
-  const tiltCurve: MockTiltResult['mlOptimization']['tiltCurve'] = [];
+  const tiltCurve: NonNullable<MockTiltResult['mlOptimization']['tiltCurve']> = {
+    tilts: [],
+    effective_irradiance: [],
+    net_energy: [],
+  };
   for (let t = 0; t <= 60; t += 5) {
     const tRad = t * Math.PI / 180;
     const poa = ghi * (Math.sin(elevRad + tRad) / Math.sin(Math.max(0.01, elevRad)));
     const energy = poa * tempDerate * 0.2;
-    tiltCurve.push({
-      tilt: t,
-      effective_irradiance: parseFloat(poa.toFixed(1)),
-      net_energy: parseFloat(energy.toFixed(2)),
-    });
+    tiltCurve.tilts.push(t);
+    tiltCurve.effective_irradiance.push(parseFloat(poa.toFixed(1)));
+    tiltCurve.net_energy.push(parseFloat(energy.toFixed(2)));
   }
   
   // Efficiency calculations